@@ -1,16 +1,51 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask_caching import Cache
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import os
-import matplotlib.pyplot as plt
+import gzip
+import shutil
+import tempfile
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
 from statsmodels.tsa.seasonal import seasonal_decompose
 from statsmodels.tsa.arima.model import ARIMA
 from datetime import datetime, timedelta
 import io
 import base64
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import xxhash
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from dataset_generator import WEEKLY_LUT, YEARLY_LUT, RNG, combine_components
+
+# Column types of the generated dataset (dates are written without a time part)
+DATASET_SCHEMA = pa.schema([('date', pa.date32()), ('sales', pa.float64())])
 
 app = Flask(__name__)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
+
+# Charts are rendered off the request thread with the object-oriented Figure
+# API, which keeps no pyplot global state and is safe to use concurrently
+EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+# Each rendering thread keeps one Figure and output buffer per chart size
+_tls = threading.local()
+
+# Fitted ARIMA models keyed on a hash of the series, least recently used first
+FIT_CACHE_SIZE = 8
+_fit_cache = OrderedDict()
+_fit_cache_lock = threading.Lock()
+
+# The Burg fit differences the series before estimation, which is expected for d=1
+# (statsmodels attributes the warning to the calling module, i.e. this one)
+warnings.filterwarnings('ignore', message='Provided `endog` series has been differenced',
+                        category=UserWarning, module=__name__)
 
 # Ensure the uploads directory exists
 if not os.path.exists('uploads'):
@@ -33,9 +68,11 @@ def generate_dataset():
         # Generate the dataset
         df = generate_time_series_data(start_date, periods, seasonality, trend_strength, noise_level)
         
-        # Save to CSV
-        csv_path = os.path.join('uploads', 'sales_data.csv')
-        df.to_csv(csv_path, index=False)
+        # Save as Feather for forecasting; the CSV is only written when downloaded
+        data_path = os.path.join('uploads', 'sales_data.feather')
+        temp_path = _temp_path(data_path)
+        df.to_feather(temp_path)
+        os.replace(temp_path, data_path)
         
         # Create preview charts
         preview_img = create_preview_chart(df)
@@ -52,29 +89,47 @@ def generate_dataset():
 
 @app.route('/download_dataset')
 def download_dataset():
+    data_path = os.path.join('uploads', 'sales_data.feather')
     file_path = os.path.join('uploads', 'sales_data.csv')
+    # Refresh the CSV if the dataset was regenerated since the last download
+    if os.path.exists(data_path) and (not os.path.exists(file_path)
+                                      or os.path.getmtime(file_path) < os.path.getmtime(data_path)):
+        save_csv(pd.read_feather(data_path), file_path)
+    
+    # Serve the precompressed copy to clients that accept gzip
+    gz_path = file_path + '.gz'
+    if ('gzip' in request.headers.get('Accept-Encoding', '') and os.path.exists(gz_path)
+            and os.path.getmtime(gz_path) >= os.path.getmtime(file_path)):
+        response = send_from_directory('uploads', 'sales_data.csv.gz', as_attachment=True,
+                                       download_name='sales_data.csv', mimetype='text/csv',
+                                       conditional=True, etag=True)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+    
     if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+        response = send_from_directory('uploads', 'sales_data.csv', as_attachment=True,
+                                       conditional=True, etag=True)
+        response.vary.add('Accept-Encoding')
+        return response
     else:
         return jsonify({'status': 'error', 'message': 'File not found'})
 
 @app.route('/forecast', methods=['POST'])
 def forecast():
     try:
-        file_path = os.path.join('uploads', 'sales_data.csv')
+        # Fall back to the CSV for datasets that were not generated by this app
+        file_path = os.path.join('uploads', 'sales_data.feather')
+        if not os.path.exists(file_path):
+            file_path = os.path.join('uploads', 'sales_data.csv')
         if not os.path.exists(file_path):
             return jsonify({'status': 'error', 'message': 'No dataset found. Please generate one first.'})
         
-        # Read the dataset
-        df = pd.read_csv(file_path)
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-        
         # Get forecast parameters
         forecast_periods = int(request.form.get('forecast_periods', 30))
         
-        # Perform the forecast
-        result = perform_forecast(df, forecast_periods)
+        # Perform the forecast (reused while the dataset file is unchanged)
+        result = cached_forecast(file_path, os.stat(file_path).st_mtime_ns, forecast_periods)
         
         return jsonify({
             'status': 'success',
@@ -84,10 +139,55 @@ def forecast():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+@cache.memoize()
+def cached_forecast(file_path, mtime, forecast_periods):
+    """Read the dataset and forecast it, memoized on the file's modification time"""
+    if file_path.endswith('.feather'):
+        # Feather keeps the datetime dtype, so no parsing is needed
+        df = pd.read_feather(file_path)
+    else:
+        df = pacsv.read_csv(file_path).to_pandas(date_as_object=False)
+    df.set_index('date', inplace=True)
+    
+    return perform_forecast(df, forecast_periods)
+
+def _temp_path(path):
+    """Create an empty temporary file next to path, to be moved over it with os.replace"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    return temp_path
+
+def save_csv(df, csv_path):
+    """Write the dataset to CSV (Arrow's C++ writer is much faster than DataFrame.to_csv)"""
+    # Both files are written under temporary names and moved into place, so a
+    # download being served never reads a partially written file
+    temp_csv = _temp_path(csv_path)
+    temp_gz = _temp_path(csv_path + '.gz')
+    try:
+        # Arrow always quotes the header row, so it is written separately; the schema
+        # has no string columns, so the data rows need no quoting either
+        with open(temp_csv, 'wb') as f_out:
+            f_out.write((','.join(DATASET_SCHEMA.names) + '\n').encode('ascii'))
+            pacsv.write_csv(pa.Table.from_pandas(df, schema=DATASET_SCHEMA, preserve_index=False), f_out,
+                            pacsv.WriteOptions(include_header=False, quoting_style='none'))
+        
+        # Keep a gzipped copy so downloads can skip on-the-fly compression
+        with open(temp_csv, 'rb') as f_in, gzip.open(temp_gz, 'wb', compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        
+        os.replace(temp_csv, csv_path)
+        os.replace(temp_gz, csv_path + '.gz')
+    finally:
+        for temp_path in (temp_csv, temp_gz):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
 def generate_time_series_data(start_date, periods, seasonality, trend_strength, noise_level):
     """Generate synthetic time series data for sales forecasting"""
-    # Create date range
-    dates = pd.date_range(start=start_date, periods=periods)
+    # Create date range (calendar fields below are computed on the datetime64[D] values)
+    start = pd.Timestamp(start_date).to_datetime64().astype('datetime64[D]')
+    dates = np.arange(start, start + periods)
+    months = dates.astype('datetime64[M]')
     
     # Create base trend (linear increase)
     trend = np.linspace(100, 100 + (100 * trend_strength), periods)
@@ -95,106 +195,153 @@ def generate_time_series_data(start_date, periods, seasonality, trend_strength,
     # Add seasonality
     if seasonality == 'weekly':
         # Weekly pattern (weekends have higher sales)
-        day_of_week = dates.dayofweek
-        seasonal = np.zeros(periods)
-        seasonal[day_of_week == 5] = 30  # Saturday
-        seasonal[day_of_week == 6] = 40  # Sunday
-        seasonal[day_of_week == 4] = 20  # Friday
+        day_of_week = (dates.view('i8') + 3) % 7  # 1970-01-01 was a Thursday
+        seasonal = np.take(WEEKLY_LUT, day_of_week)
     elif seasonality == 'monthly':
         # Monthly pattern (higher sales at month end)
-        day_of_month = dates.day
-        days_in_month = dates.daysinmonth
-        seasonal = 30 * (day_of_month / days_in_month)
+        day_of_month = (dates - months).astype(np.int64) + 1
+        days_in_month = ((months + 1) - months.astype('datetime64[D]')).astype(np.int64)
+        seasonal = 30 * day_of_month / days_in_month
     else:  # yearly
         # Yearly pattern (higher sales in summer and holiday season)
-        month = dates.month
-        seasonal = np.zeros(periods)
-        # Summer peak (June-August)
-        seasonal[(month >= 6) & (month <= 8)] = 30
-        # Holiday season peak (November-December)
-        seasonal[(month >= 11) & (month <= 12)] = 40
+        seasonal = np.take(YEARLY_LUT, months.astype(np.int64) % 12)
     
     # Add noise
-    noise = np.random.normal(0, noise_level * 100, periods)
+    noise = RNG.standard_normal(periods) * (noise_level * 100)
     
     # Combine components
-    sales = trend + seasonal + noise
-    sales = np.maximum(sales, 0)  # Ensure no negative sales
+    sales = np.empty(periods)
+    combine_components(trend, seasonal, noise, sales)  # Ensures no negative sales
+    
+    # Add some special events (like promotions or holidays)
+    special_events = RNG.choice(periods, size=int(periods * 0.05), replace=False)
+    sales[special_events] *= RNG.uniform(1.2, 1.5, size=special_events.size)
     
     # Create DataFrame
     df = pd.DataFrame({'date': dates, 'sales': sales})
     
-    # Add some special events (like promotions or holidays)
-    special_events = np.random.choice(periods, size=int(periods * 0.05), replace=False)
-    df.loc[special_events, 'sales'] *= np.random.uniform(1.2, 1.5, size=len(special_events))
-    
     return df
 
 def create_preview_chart(df):
     """Create a preview chart of the generated data"""
-    plt.figure(figsize=(10, 6))
-    plt.plot(df['date'], df['sales'], color='#E63946')
-    plt.title('Generated Sales Data')
-    plt.xlabel('Date')
-    plt.ylabel('Sales')
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    
-    # Convert plot to base64 string
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
+    return EXECUTOR.submit(_render_preview_chart, df).result()
+
+def _get_render_target(figsize):
+    """Return this thread's cleared (figure, buffer) pair for the given chart size"""
+    targets = getattr(_tls, 'targets', None)
+    if targets is None:
+        targets = _tls.targets = {}
+    if figsize not in targets:
+        fig = Figure(figsize=figsize)
+        FigureCanvas(fig)
+        targets[figsize] = (fig, io.BytesIO())
+    
+    fig, buffer = targets[figsize]
+    fig.clf()
     buffer.seek(0)
-    image_png = buffer.getvalue()
-    buffer.close()
-    plt.close()
+    buffer.truncate()
+    return fig, buffer
+
+def _encode_figure(fig, buffer):
+    """Save the figure into the buffer and return it as a base64-encoded JPEG"""
+    # JPEG encodes faster and smaller than PNG
+    fig.savefig(buffer, format='jpg', dpi=90, pil_kwargs={'quality': 85})
+    
+    # Encode from a view of the buffer rather than a copy of its bytes; the view is
+    # released before returning so the buffer can be truncated for the next chart
+    with buffer.getbuffer() as image_jpg:
+        return base64.b64encode(image_jpg).decode('ascii')
+
+def _render_preview_chart(df):
+    """Render the preview chart to a base64-encoded image"""
+    fig, buffer = _get_render_target((10, 6))
+    ax = fig.add_subplot(111)
+    ax.plot(df['date'], df['sales'], color='#E63946')
+    ax.set_title('Generated Sales Data')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Sales')
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    
+    return _encode_figure(fig, buffer)
+
+def _render_forecast_chart(df, forecast_df):
+    """Render the historical data and forecast to a base64-encoded image"""
+    fig, buffer = _get_render_target((12, 6))
+    ax = fig.add_subplot(111)
+    ax.plot(df.index, df['sales'], label='Historical', color='#2A9D8F')
+    ax.plot(forecast_df['date'], forecast_df['forecast'], label='Forecast', color='#E76F51', linestyle='--')
+    ax.fill_between(forecast_df['date'].to_numpy(), 
+                    forecast_df['lower'].to_numpy(), 
+                    forecast_df['upper'].to_numpy(), 
+                    color='#E76F51', alpha=0.2)
+    ax.set_title('Sales Forecast')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Sales')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
     
-    return base64.b64encode(image_png).decode('utf-8')
+    return _encode_figure(fig, buffer)
+
+def get_fitted_model(sales):
+    """Fit an ARIMA model to the sales series, reusing cached fits of identical data"""
+    hasher = xxhash.xxh3_64(sales.index.values.tobytes())
+    hasher.update(sales.values.tobytes())
+    key = hasher.intdigest()
+    
+    with _fit_cache_lock:
+        model_fit = _fit_cache.get(key)
+        if model_fit is not None:
+            _fit_cache.move_to_end(key)
+            return model_fit
+    
+    # Pure AR model, so Burg's closed-form estimator replaces iterative MLE
+    model = ARIMA(sales, order=(5, 1, 0))
+    model_fit = model.fit(method='burg')
+    
+    with _fit_cache_lock:
+        _fit_cache[key] = model_fit
+        if len(_fit_cache) > FIT_CACHE_SIZE:
+            _fit_cache.popitem(last=False)
+    
+    return model_fit
 
 def perform_forecast(df, forecast_periods):
     """Perform time series forecasting on the dataset"""
-    # Fit ARIMA model
-    model = ARIMA(df['sales'], order=(5, 1, 0))
-    model_fit = model.fit()
+    # Fit ARIMA model (reused across forecast horizons for the same data)
+    model_fit = get_fitted_model(df['sales'])
     
-    # Forecast future values
-    forecast = model_fit.forecast(steps=forecast_periods)
+    # Forecast future values with a one standard deviation (~68%) prediction interval
+    prediction = model_fit.get_forecast(steps=forecast_periods)
+    forecast = prediction.predicted_mean.to_numpy()
+    interval = prediction.conf_int(alpha=0.32).to_numpy()
     
     # Create forecast dates
     last_date = df.index[-1]
     forecast_dates = pd.date_range(start=last_date + timedelta(days=1), periods=forecast_periods)
     
     # Create forecast DataFrame
-    forecast_df = pd.DataFrame({'date': forecast_dates, 'forecast': forecast})
+    forecast_df = pd.DataFrame({
+        'date': forecast_dates,
+        'forecast': forecast,
+        'lower': interval[:, 0],
+        'upper': interval[:, 1]
+    })
     
     # Create the chart
-    plt.figure(figsize=(12, 6))
-    plt.plot(df.index, df['sales'], label='Historical', color='#2A9D8F')
-    plt.plot(forecast_df['date'], forecast_df['forecast'], label='Forecast', color='#E76F51', linestyle='--')
-    plt.fill_between(forecast_df['date'], 
-                    forecast_df['forecast'] - forecast_df['forecast'].std(), 
-                    forecast_df['forecast'] + forecast_df['forecast'].std(), 
-                    color='#E76F51', alpha=0.2)
-    plt.title('Sales Forecast')
-    plt.xlabel('Date')
-    plt.ylabel('Sales')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    
-    # Convert plot to base64 string
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    image_png = buffer.getvalue()
-    buffer.close()
-    plt.close()
+    chart = EXECUTOR.submit(_render_forecast_chart, df, forecast_df).result()
     
-    # Calculate some metrics
-    mse = ((df['sales'].iloc[-forecast_periods:].values - forecast[:forecast_periods]) ** 2).mean()
-    mae = np.abs(df['sales'].iloc[-forecast_periods:].values - forecast[:forecast_periods]).mean()
+    # Calculate some metrics on the last forecast_periods of history, using
+    # dynamic (multi-step) predictions from the fitted model instead of refitting
+    holdout = min(forecast_periods, len(df) - 1)
+    fitted = model_fit.get_prediction(start=len(df) - holdout, dynamic=True).predicted_mean
+    errors = df['sales'].iloc[-holdout:].values - fitted.values
+    mse = (errors ** 2).mean()
+    mae = np.abs(errors).mean()
     
     return {
-        'chart': base64.b64encode(image_png).decode('utf-8'),
+        'chart': chart,
         'metrics': {
             'mse': float(mse),
             'mae': float(mae)
@@ -202,4 +349,5 @@ def perform_forecast(df, forecast_periods):
     }
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Local development server only; use gunicorn in production (see README)
+    app.run(debug=False)
@@ -1,9 +1,36 @@
 import pandas as pd
 import numpy as np
+from numba import njit
+from statsmodels.tsa.seasonal import seasonal_decompose
 from datetime import datetime, timedelta
 import argparse
 import os
 
+# Seasonal uplift by day of week (Monday=0) and by month (January=0)
+WEEKLY_LUT = np.array([0, 0, 0, 0, 20, 30, 40], dtype=np.float64)  # Friday to Sunday peak
+YEARLY_LUT = np.array([0, 0, 0, 0, 0, 30, 30, 30, 0, 0, 40, 40], dtype=np.float64)  # Summer and holiday peaks
+
+# Shared PCG64 generator for all random draws
+RNG = np.random.default_rng()
+
+def _reseed_rng():
+    """Give a forked process (e.g. a gunicorn --preload worker) its own random stream"""
+    RNG.bit_generator.state = np.random.PCG64().state
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reseed_rng)
+
+# Product categories and their sales columns
+CATEGORIES = ['Electronics', 'Clothing', 'Food', 'Home Goods']
+CATEGORY_COLUMNS = [f'{category.lower()}_sales' for category in CATEGORIES]
+
+@njit('void(f8[:], f8[:], f8[:], f8[:])', fastmath=True, cache=True)
+def combine_components(trend, seasonal, noise, out):
+    """Sum the trend, seasonal and noise components into out in one pass, clipping at zero"""
+    for i in range(out.size):
+        value = trend[i] + seasonal[i] + noise[i]
+        out[i] = value if value > 0 else 0.0
+
 def generate_sales_data(
     start_date='2023-01-01',
     periods=365,
@@ -30,8 +57,10 @@ def generate_sales_data(
     output_file : str
         Path to save the CSV file
     """
-    # Create date range
-    dates = pd.date_range(start=start_date, periods=periods)
+    # Create date range (calendar fields below are computed on the datetime64[D] values)
+    start = pd.Timestamp(start_date).to_datetime64().astype('datetime64[D]')
+    dates = np.arange(start, start + periods)
+    months = dates.astype('datetime64[M]')
     
     # Create base trend (linear increase)
     trend = np.linspace(100, 100 + (100 * trend_strength), periods)
@@ -39,31 +68,27 @@ def generate_sales_data(
     # Add seasonality
     if seasonality == 'weekly':
         # Weekly pattern (weekends have higher sales)
-        day_of_week = dates.dayofweek
-        seasonal = np.zeros(periods)
-        seasonal[day_of_week == 5] = 30  # Saturday
-        seasonal[day_of_week == 6] = 40  # Sunday
-        seasonal[day_of_week == 4] = 20  # Friday
+        day_of_week = (dates.view('i8') + 3) % 7  # 1970-01-01 was a Thursday
+        seasonal = np.take(WEEKLY_LUT, day_of_week)
     elif seasonality == 'monthly':
         # Monthly pattern (higher sales at month end)
-        day_of_month = dates.day
-        days_in_month = dates.daysinmonth
-        seasonal = 30 * (day_of_month / days_in_month)
+        day_of_month = (dates - months).astype(np.int64) + 1
+        days_in_month = ((months + 1) - months.astype('datetime64[D]')).astype(np.int64)
+        seasonal = 30 * day_of_month / days_in_month
     else:  # yearly
         # Yearly pattern (higher sales in summer and holiday season)
-        month = dates.month
-        seasonal = np.zeros(periods)
-        # Summer peak (June-August)
-        seasonal[(month >= 6) & (month <= 8)] = 30
-        # Holiday season peak (November-December)
-        seasonal[(month >= 11) & (month <= 12)] = 40
+        seasonal = np.take(YEARLY_LUT, months.astype(np.int64) % 12)
     
     # Add noise
-    noise = np.random.normal(0, noise_level * 100, periods)
+    noise = RNG.standard_normal(periods) * (noise_level * 100)
     
     # Combine components
-    sales = trend + seasonal + noise
-    sales = np.maximum(sales, 0)  # Ensure no negative sales
+    sales = np.empty(periods)
+    combine_components(trend, seasonal, noise, sales)  # Ensures no negative sales
+    
+    # Add some special events (like promotions or holidays)
+    special_events = RNG.choice(periods, size=int(periods * 0.05), replace=False)
+    sales[special_events] *= RNG.uniform(1.2, 1.5, size=special_events.size)
     
     # Create DataFrame
     df = pd.DataFrame({
@@ -71,22 +96,16 @@ def generate_sales_data(
         'sales': sales
     })
     
-    # Add some special events (like promotions or holidays)
-    special_events = np.random.choice(periods, size=int(periods * 0.05), replace=False)
-    df.loc[special_events, 'sales'] *= np.random.uniform(1.2, 1.5, size=len(special_events))
-    
     # Add product categories with different characteristics
-    categories = ['Electronics', 'Clothing', 'Food', 'Home Goods']
-    for category in categories:
-        # Create unique pattern for each category
-        cat_trend = trend * np.random.uniform(0.6, 1.4)
-        cat_seasonal = seasonal * np.random.uniform(0.8, 1.2)
-        cat_noise = np.random.normal(0, noise_level * 80, periods)
-        cat_sales = cat_trend + cat_seasonal + cat_noise
-        cat_sales = np.maximum(cat_sales, 0)
-        
-        # Add to dataframe
-        df[f'{category.lower()}_sales'] = cat_sales.round(2)
+    # Create a unique pattern for each category, one row per category
+    trend_scales = RNG.uniform(0.6, 1.4, size=(len(CATEGORIES), 1))
+    seasonal_scales = RNG.uniform(0.8, 1.2, size=(len(CATEGORIES), 1))
+    cat_noise = RNG.standard_normal((len(CATEGORIES), periods)) * (noise_level * 80)
+    cat_sales = trend_scales * trend + seasonal_scales * seasonal + cat_noise
+    cat_sales = np.maximum(cat_sales, 0).round(2)
+    
+    # Add to dataframe
+    df[CATEGORY_COLUMNS] = cat_sales.T
     
     # Round the main sales column
     df['sales'] = df['sales'].round(2)
@@ -97,6 +116,24 @@ def generate_sales_data(
     
     return df
 
+def decompose_categories(df, period=7):
+    """
+    Decompose all product category series in a single seasonal_decompose call
+    
+    Parameters:
+    -----------
+    df : DataFrame
+        Dataset returned by generate_sales_data
+    period : int
+        Seasonal period in days
+    
+    Returns:
+    --------
+    DecomposeResult whose trend, seasonal and resid are (periods, categories)
+    arrays, with columns in CATEGORY_COLUMNS order
+    """
+    return seasonal_decompose(df[CATEGORY_COLUMNS].to_numpy(), period=period, extrapolate_trend=period)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate synthetic sales time series data")
     parser.add_argument("--start_date", default="2023-01-01", help="Start date (YYYY-MM-DD)")
@@ -105,10 +142,11 @@ if __name__ == "__main__":
     parser.add_argument("--trend_strength", type=float, default=0.5, help="Trend strength (0.0-1.0)")
     parser.add_argument("--noise_level", type=float, default=0.2, help="Noise level (0.0-1.0)")
     parser.add_argument("--output", default="sales_data.csv", help="Output file path")
+    parser.add_argument("--decompose", action="store_true", help="Print the weekly seasonal amplitude of each category")
     
     args = parser.parse_args()
     
-    generate_sales_data(
+    df = generate_sales_data(
         start_date=args.start_date,
         periods=args.periods,
         seasonality=args.seasonality,
@@ -116,3 +154,12 @@ if __name__ == "__main__":
         noise_level=args.noise_level,
         output_file=args.output
     )
+    
+    if args.decompose:
+        period = 7
+        if args.periods < 2 * period:
+            print(f"Skipping decomposition: it needs at least {2 * period} days of data")
+        else:
+            seasonal = decompose_categories(df, period=period).seasonal
+            for category, amplitude in zip(CATEGORIES, seasonal.max(axis=0) - seasonal.min(axis=0)):
+                print(f"{category}: weekly seasonal amplitude {amplitude:.2f}")